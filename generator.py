@@ -1,15 +1,29 @@
-import json
+import atexit
 import time
 import math
 import random
 import os
+import signal
+import sys
+import queue
 import subprocess
+import threading
 from datetime import datetime, timezone
 
+import numpy as np
+import orjson
+from numba import njit, prange
+
 # --- CONFIGURATION ---
 STATE_FILE = "engine_state.json"
-HISTORY_FILE = "stock_history.json"
+HISTORY_FILE = "stock_history.ndjson"  # Local append-only log of bars since the last snapshot (not pushed)
+ROTATED_HISTORY_FILE = HISTORY_FILE + ".old"  # Previous log, kept until its snapshot is on disk
+SNAPSHOT_FILE = "stock_history.json"  # Flat {symbol: [bars]} copy of the history, refreshed hourly
 SYMBOLS = ["AAPL", "GOOG", "AMZN", "MSFT", "NVDA"]
+HISTORY_LENGTH = 3 * 24 * 60 * 60  # Keep the last 3 days of 1-second bars
+SNAPSHOT_CHUNK = 10_000  # Bars encoded per orjson call when writing the snapshot
+PARALLEL_MIN_SYMBOLS = 32  # Below this, running symbols across cores is slower than a plain loop
+TICK_OFFSET = 0.1  # Ticks fire this many seconds after each whole wall-clock second
 
 # --- MODEL PARAMETERS ---
 # GARCH(1,1) parameters for volatility clustering
@@ -28,10 +42,20 @@ REVERSION_RANGES = {
     "d1": (0.10, 0.10)  # Daily is a fixed, wide band
 }
 
+# Source of the per-second price shocks (PCG64, Ziggurat normals)
+_rng = np.random.default_rng()
+
+# Serializes snapshot writes between the git worker and the shutdown hook
+_snapshot_lock = threading.Lock()
+
 
 class SyntheticStream:
     """Holds the entire state for a single stock's simulation."""
 
+    __slots__ = ("p", "d1_open", "h1_open", "m5_open", "m1_open",
+                 "rs_s1", "rs_m1", "rs_m5", "rs_h1", "rs_d1",
+                 "garch_variance", "prev_return", "boundary_trend")
+
     def __init__(self, initial_price=100.0):
         self.p = float(initial_price)
 
@@ -42,13 +66,11 @@ class SyntheticStream:
         self.m1_open = self.p
 
         # Reversion strengths (half-life of the bands)
-        self.reversion_strength = {
-            "s1": random.uniform(*REVERSION_RANGES["s1"]) / 2.0,
-            "m1": random.uniform(*REVERSION_RANGES["m1"]) / 2.0,
-            "m5": random.uniform(*REVERSION_RANGES["m5"]) / 2.0,
-            "h1": random.uniform(*REVERSION_RANGES["h1"]) / 2.0,
-            "d1": random.uniform(*REVERSION_RANGES["d1"]) / 2.0,
-        }
+        self.rs_s1 = random.uniform(*REVERSION_RANGES["s1"]) / 2.0
+        self.rs_m1 = random.uniform(*REVERSION_RANGES["m1"]) / 2.0
+        self.rs_m5 = random.uniform(*REVERSION_RANGES["m5"]) / 2.0
+        self.rs_h1 = random.uniform(*REVERSION_RANGES["h1"]) / 2.0
+        self.rs_d1 = random.uniform(*REVERSION_RANGES["d1"]) / 2.0
 
         # State for the GARCH volatility model
         self.garch_variance = 1e-5
@@ -58,102 +80,386 @@ class SyntheticStream:
         self.boundary_trend = 0  # -1 for down pressure, +1 for up pressure
 
     def to_dict(self):
-        return self.__dict__
+        return {k: getattr(self, k) for k in self.__slots__}
 
     @classmethod
     def from_dict(cls, data):
         instance = cls()
-        instance.__dict__.update(data)
+        # Keys left over from older engine versions are ignored
+        for k in cls.__slots__:
+            if k in data: setattr(instance, k, data[k])
+        # Older state files keep the reversion strengths in a single dict
+        for tf, strength in data.get("reversion_strength", {}).items():
+            setattr(instance, "rs_" + tf, strength)
         return instance
 
 
+class StreamArray:
+    """Holds the state of every stock's simulation as parallel arrays (one slot per symbol)."""
+
+    def __init__(self, symbols, streams):
+        self.symbols = list(symbols)
+
+        self.p = np.array([st.p for st in streams], dtype=np.float64)
+
+        # Anchors for mean reversion
+        self.d1_open = np.array([st.d1_open for st in streams], dtype=np.float64)
+        self.h1_open = np.array([st.h1_open for st in streams], dtype=np.float64)
+        self.m5_open = np.array([st.m5_open for st in streams], dtype=np.float64)
+        self.m1_open = np.array([st.m1_open for st in streams], dtype=np.float64)
+
+        # Reversion strengths (half-life of the bands)
+        self.rs_s1 = np.array([st.rs_s1 for st in streams], dtype=np.float64)
+        self.rs_m1 = np.array([st.rs_m1 for st in streams], dtype=np.float64)
+        self.rs_m5 = np.array([st.rs_m5 for st in streams], dtype=np.float64)
+        self.rs_h1 = np.array([st.rs_h1 for st in streams], dtype=np.float64)
+        self.rs_d1 = np.array([st.rs_d1 for st in streams], dtype=np.float64)
+
+        # State for the GARCH volatility model
+        self.garch_variance = np.array([st.garch_variance for st in streams], dtype=np.float64)
+        self.prev_return = np.array([st.prev_return for st in streams], dtype=np.float64)
+
+        # State for boundary enforcement
+        self.boundary_trend = np.array([st.boundary_trend for st in streams], dtype=np.int8)
+
+        # Epoch minute of the previous tick, used to detect when the time-based anchors roll over
+        self.last_minute = None
+
+    def stream(self, i):
+        """Returns the state of the i-th symbol as a standalone SyntheticStream."""
+        # Bypass __init__; every slot is set below, so its random draws would be wasted
+        st = SyntheticStream.__new__(SyntheticStream)
+        st.p = float(self.p[i])
+        st.d1_open = float(self.d1_open[i])
+        st.h1_open = float(self.h1_open[i])
+        st.m5_open = float(self.m5_open[i])
+        st.m1_open = float(self.m1_open[i])
+        st.rs_s1 = float(self.rs_s1[i])
+        st.rs_m1 = float(self.rs_m1[i])
+        st.rs_m5 = float(self.rs_m5[i])
+        st.rs_h1 = float(self.rs_h1[i])
+        st.rs_d1 = float(self.rs_d1[i])
+        st.garch_variance = float(self.garch_variance[i])
+        st.prev_return = float(self.prev_return[i])
+        st.boundary_trend = int(self.boundary_trend[i])
+        return st
+
+    def to_dict(self):
+        return {s: self.stream(i).to_dict() for i, s in enumerate(self.symbols)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.keys(), [SyntheticStream.from_dict(d) for d in data.values()])
+
+
+# U-shaped volatility multiplier for every minute of the day, precomputed once
+_U_TABLE = 0.75 + 0.5 * np.cos(2.0 * math.pi * (np.arange(1440) / 1440.0)) ** 2
+
+
+@njit(cache=True)
 def _u_seasonality(minute_of_day):
     """Models the U-shaped volatility pattern of a trading day."""
-    x = 2.0 * math.pi * (minute_of_day / 1440.0)
-    return 0.75 + 0.5 * (math.cos(x) ** 2)
+    return _U_TABLE[minute_of_day]
+
+
+class BarHistory:
+    """Fixed-size ring buffer holding the most recent bars of a single stock."""
 
+    # float64 so bars imported from older files keep their exact prices
+    DTYPE = np.dtype([("t", "i8"), ("o", "f8"), ("h", "f8"), ("l", "f8"), ("c", "f8")])
 
+    def __init__(self, capacity=HISTORY_LENGTH):
+        self.bars = np.empty(capacity, dtype=self.DTYPE)
+        self.head = 0  # Slot the next bar is written to
+        self.size = 0
+        self.unsaved = 0  # Bars appended since the last take_unsaved()
+
+    def append(self, t, o, h, l, c):
+        self.bars[self.head] = (t, o, h, l, c)
+        self.head = (self.head + 1) % len(self.bars)
+        if self.size < len(self.bars): self.size += 1
+        if self.unsaved < len(self.bars): self.unsaved += 1
+
+    def ordered(self):
+        """Returns the stored bars, oldest first."""
+        if self.size < len(self.bars):
+            return self.bars[:self.size]
+        return np.concatenate((self.bars[self.head:], self.bars[:self.head]))
+
+    def last_time(self):
+        """Returns the timestamp of the newest bar, or None when empty."""
+        return int(self.bars["t"][self.head - 1]) if self.size else None
+
+    def take_unsaved(self):
+        """Returns the bars appended since the previous call, oldest first."""
+        # Gather just the newest slots rather than unrolling the whole buffer
+        bars = self.bars[(self.head - self.unsaved + np.arange(self.unsaved)) % len(self.bars)]
+        self.unsaved = 0
+        return _bar_records(bars)
+
+    @classmethod
+    def from_list(cls, data):
+        instance = cls()
+        data = data[-len(instance.bars):]
+        for k in instance.DTYPE.names:
+            instance.bars[k][:len(data)] = [bar[k] for bar in data]
+        instance.size = len(data)
+        instance.head = len(data) % len(instance.bars)
+        return instance
+
+
+def _bar_records(bars):
+    """Converts a BarHistory array slice into a list of {t, o, h, l, c} dicts."""
+    columns = [bars[k].tolist() for k in "tohlc"]
+    return [{"t": t, "o": o, "h": h, "l": l, "c": c} for t, o, h, l, c in zip(*columns)]
+
+
+def _atomic_write(path, write):
+    """Calls write(f) on a temporary file, then moves it over path so it is never left half-written."""
+    tmp = path + ".tmp"
+    with open(tmp, 'wb') as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _atomic_write_json(path, obj):
+    """Writes obj to path as JSON without ever leaving a half-written file behind."""
+    _atomic_write(path, lambda f: f.write(orjson.dumps(obj)))
+
+
+def _read_history_log(path, history):
+    """Replays the bars of a history log into the ring buffers and returns how many were new."""
+    replayed = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                bar = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue  # A line cut short by a crash mid-append
+            if bar["s"] not in history: history[bar["s"]] = BarHistory()
+            bars = history[bar["s"]]
+            # Bars already in the snapshot can show up again if the process died before the log was rotated out
+            last_t = bars.last_time()
+            if last_t is not None and bar["t"] <= last_t:
+                continue
+            bars.append(bar["t"], bar["o"], bar["h"], bar["l"], bar["c"])
+            replayed += 1
+    for bars in history.values():
+        bars.unsaved = 0
+    return replayed
+
+
+def _append_history_log(path, history):
+    """Appends the bars generated since the last save to the history log."""
+    with open(path, 'ab') as f:
+        for symbol, bars in history.items():
+            for bar in bars.take_unsaved():
+                f.write(orjson.dumps({"s": symbol, **bar}) + b"\n")
+
+
+@njit(cache=True)
+def _fast_exp(x):
+    """exp(x) via a degree-4 Taylor/Horner polynomial; accurate to <1e-7 for the small per-second returns."""
+    if -0.1 < x < 0.1:
+        return 1.0 + x * (1.0 + x * (0.5 + x * (1.0 / 6.0 + x / 24.0)))
+    return math.exp(x)
+
+
+@njit(cache=True)
+def _to_cents(x):
+    """Rounds a price to cents (half up)."""
+    return math.floor(x * 100.0 + 0.5) / 100.0
+
+
+@njit(cache=True, fastmath=True)
 def _get_garch_volatility(prev_return, prev_variance):
     """Calculates the next volatility value based on the GARCH model."""
-    # The GJR-GARCH model includes leverage effect (bad news increases vol more)
-    leverage_effect = GARCH_GAMMA * (prev_return ** 2 if prev_return < 0 else 0.0)
+    r2 = prev_return * prev_return
 
-    new_variance = (
-            GARCH_OMEGA +
-            GARCH_ALPHA * prev_return ** 2 +
-            leverage_effect +
-            GARCH_BETA * prev_variance
-    )
+    # The GJR-GARCH model includes leverage effect (bad news increases vol more)
+    # Written as one multiply-add chain so it lowers to fused multiply-adds
+    alpha = GARCH_ALPHA + GARCH_GAMMA if prev_return < 0.0 else GARCH_ALPHA
+    new_variance = GARCH_OMEGA + alpha * r2 + GARCH_BETA * prev_variance
     return max(1e-9, math.sqrt(new_variance)), new_variance
 
 
-def _generate_one_second(st, now_dt):
-    """Generates a single bar of data using all modern principles."""
-    minute_of_day = now_dt.hour * 60 + now_dt.minute
-
+@njit(cache=True, fastmath=True)
+def _tick_kernel(p, m1o, m5o, h1o, d1o, rs_s1, rs_m1, rs_m5, rs_h1, rs_d1, garch_var, prev_ret, boundary_trend,
+                 minute_of_day, new_m1, new_m5, new_h1, new_d1, gauss_sample):
+    """Advances a single stock by one second and returns its updated state plus the new (o, h, l, c) bar."""
     # 1. Update Time-Based Anchors
-    if now_dt.second == 0:
-        st.m1_open = st.p
-        if now_dt.minute % 5 == 0: st.m5_open = st.p
-        if now_dt.minute == 0: st.h1_open = st.p
-        if now_dt.hour == 0 and now_dt.minute == 0: st.d1_open = st.p
+    if new_m1: m1o = p
+    if new_m5: m5o = p
+    if new_h1: h1o = p
+    if new_d1: d1o = p
 
     # 2. Calculate Volatility for this Second (GARCH + Seasonality)
-    sigma, new_variance = _get_garch_volatility(st.prev_return, st.garch_variance)
-    st.garch_variance = new_variance
+    sigma, garch_var = _get_garch_volatility(prev_ret, garch_var)
     seasonal_vol = sigma * _u_seasonality(minute_of_day)
 
     # 3. Define the Price Boundaries (Multi-Scale Mean Reversion)
     # The "safe" price is bounded by the tightest of all timeframe bands.
-    s1_open = st.p  # The 1-second anchor is always the last price
-
-    bands = {
-        "s1": (s1_open * (1 - st.reversion_strength["s1"]), s1_open * (1 + st.reversion_strength["s1"])),
-        "m1": (st.m1_open * (1 - st.reversion_strength["m1"]), st.m1_open * (1 + st.reversion_strength["m1"])),
-        "m5": (st.m5_open * (1 - st.reversion_strength["m5"]), st.m5_open * (1 + st.reversion_strength["m5"])),
-        "h1": (st.h1_open * (1 - st.reversion_strength["h1"]), st.h1_open * (1 + st.reversion_strength["h1"])),
-        "d1": (st.d1_open * (1 - st.reversion_strength["d1"]), st.d1_open * (1 + st.reversion_strength["d1"])),
-    }
+    # The 1-second anchor is always the last price.
+    s1_open = p
+    s1l = s1_open * (1 - rs_s1); s1u = s1_open * (1 + rs_s1)
+    m1l = m1o * (1 - rs_m1); m1u = m1o * (1 + rs_m1)
+    m5l = m5o * (1 - rs_m5); m5u = m5o * (1 + rs_m5)
+    h1l = h1o * (1 - rs_h1); h1u = h1o * (1 + rs_h1)
+    d1l = d1o * (1 - rs_d1); d1u = d1o * (1 + rs_d1)
 
     # The final boundary is the most restrictive combination of all bands
-    lower_bound = max(b[0] for b in bands.values())
-    upper_bound = min(b[1] for b in bands.values())
+    lower_bound = max(s1l, m1l, m5l, h1l, d1l)
+    upper_bound = min(s1u, m1u, m5u, h1u, d1u)
 
-    # 4. Generate Random Shock and Apply Boundary Force
-    base_return = random.gauss(0, 1) * seasonal_vol
+    # 4. Apply the Random Shock and Boundary Force
+    base_return = gauss_sample * seasonal_vol
 
     # Apply a drift based on the boundary trend memory
-    boundary_drift = st.boundary_trend * seasonal_vol * 0.1
+    boundary_drift = boundary_trend * seasonal_vol * 0.1
 
     total_return = base_return + boundary_drift
 
-    o = st.p
-    c = o * math.exp(total_return)
+    o = p
+    c = o * _fast_exp(total_return)
 
     # 5. Enforce Strict Boundaries and Update Trend
-    if c >= upper_bound:
-        c = upper_bound
-        st.boundary_trend = -1  # Force price down
-    elif c <= lower_bound:
-        c = lower_bound
-        st.boundary_trend = 1  # Force price up
+    at_upper = c >= upper_bound  # Force price down
+    at_lower = c <= lower_bound  # Force price up
+    c_clamped = min(max(c, lower_bound), upper_bound)
+
     # If price returns to the middle of the channel, ease the trend pressure
-    elif st.boundary_trend != 0:
-        channel_mid = (upper_bound + lower_bound) / 2
-        if (st.boundary_trend == -1 and c < channel_mid) or \
-                (st.boundary_trend == 1 and c > channel_mid):
-            st.boundary_trend = 0
+    channel_mid = (upper_bound + lower_bound) / 2
+    eased = (boundary_trend == -1 and c_clamped < channel_mid) or \
+            (boundary_trend == 1 and c_clamped > channel_mid)
+    boundary_trend = -1 if at_upper else (1 if at_lower else (0 if eased else boundary_trend))
+    c = c_clamped
+
+    # c is always close to o, so log1p of the relative change is both cheap and precise
+    prev_ret = math.log1p((c - o) / o) if o != 0 else 0.0
+
+    return m1o, m5o, h1o, d1o, garch_var, prev_ret, boundary_trend, o, max(o, c), min(o, c), c
+
+
+@njit(cache=True)
+def _tick_slot(i, p, m1o, m5o, h1o, d1o, rs_s1, rs_m1, rs_m5, rs_h1, rs_d1, garch_var, prev_ret, boundary_trend,
+               minute_of_day, new_m1, new_m5, new_h1, new_d1, shocks, o, h, l, c):
+    """Runs the tick kernel for symbol slot i, updating its state and writing its bar in place."""
+    (m1o[i], m5o[i], h1o[i], d1o[i], garch_var[i], prev_ret[i], boundary_trend[i],
+     bar_o, bar_h, bar_l, bar_c) = _tick_kernel(
+        p[i], m1o[i], m5o[i], h1o[i], d1o[i], rs_s1[i], rs_m1[i], rs_m5[i], rs_h1[i], rs_d1[i],
+        garch_var[i], prev_ret[i], boundary_trend[i],
+        minute_of_day, new_m1, new_m5, new_h1, new_d1, shocks[i]
+    )
+    p[i] = bar_c  # The simulation carries on from the unrounded price
+
+    # Bars are published in cents. No fastmath in this function: it would turn the /100 into *0.01
+    # and leave prices like 55.410000000000004.
+    o[i] = _to_cents(bar_o)
+    h[i] = _to_cents(bar_h)
+    l[i] = _to_cents(bar_l)
+    c[i] = _to_cents(bar_c)
+
+
+@njit(cache=True)
+def _tick_all(p, m1o, m5o, h1o, d1o, rs_s1, rs_m1, rs_m5, rs_h1, rs_d1, garch_var, prev_ret, boundary_trend,
+              minute_of_day, new_m1, new_m5, new_h1, new_d1, shocks, o, h, l, c):
+    """Runs the tick kernel over every symbol, updating the state arrays and filling the bar arrays in place."""
+    for i in range(p.shape[0]):
+        _tick_slot(i, p, m1o, m5o, h1o, d1o, rs_s1, rs_m1, rs_m5, rs_h1, rs_d1, garch_var, prev_ret, boundary_trend,
+                   minute_of_day, new_m1, new_m5, new_h1, new_d1, shocks, o, h, l, c)
+
+
+@njit(cache=True, parallel=True)
+def _tick_all_parallel(p, m1o, m5o, h1o, d1o, rs_s1, rs_m1, rs_m5, rs_h1, rs_d1, garch_var, prev_ret, boundary_trend,
+                       minute_of_day, new_m1, new_m5, new_h1, new_d1, shocks, o, h, l, c):
+    """Same as _tick_all, but spreads the symbols across cores.
+
+    Symbols are independent and each iteration only writes its own slot. The thread pool costs more than it saves
+    for a handful of symbols, so this is only used from PARALLEL_MIN_SYMBOLS up.
+    """
+    for i in prange(p.shape[0]):
+        _tick_slot(i, p, m1o, m5o, h1o, d1o, rs_s1, rs_m1, rs_m5, rs_h1, rs_d1, garch_var, prev_ret, boundary_trend,
+                   minute_of_day, new_m1, new_m5, new_h1, new_d1, shocks, o, h, l, c)
+
+
+def _generate_one_second(st, now_s):
+    """Generates a single bar of data for every symbol using the compiled tick kernel."""
+    # Work in whole epoch minutes; a datetime object per tick is needlessly heavy.
+    # Anchors reset whenever a period index changes, so a skipped or repeated second can't miss one.
+    epoch_minute = int(now_s) // 60
+    prev = st.last_minute if st.last_minute is not None else epoch_minute
+    st.last_minute = epoch_minute
+    new_m1 = epoch_minute != prev
+    new_m5 = epoch_minute // 5 != prev // 5
+    new_h1 = epoch_minute // 60 != prev // 60
+    new_d1 = epoch_minute // 1440 != prev // 1440
+
+    n = len(st.symbols)
+    o, h, l, c = np.empty(n), np.empty(n), np.empty(n), np.empty(n)
+
+    tick_all = _tick_all_parallel if n >= PARALLEL_MIN_SYMBOLS else _tick_all
+    tick_all(
+        st.p, st.m1_open, st.m5_open, st.h1_open, st.d1_open,
+        st.rs_s1, st.rs_m1, st.rs_m5, st.rs_h1, st.rs_d1,
+        st.garch_variance, st.prev_return, st.boundary_trend,
+        epoch_minute % 1440, new_m1, new_m5, new_h1, new_d1,
+        _rng.standard_normal(n), o, h, l, c
+    )
+
+    # Each bar is stamped with the whole second it belongs to
+    return int(now_s) * 1000, o, h, l, c
+
+
+def _next_tick_deadline():
+    """Returns the monotonic time of the next tick, TICK_OFFSET after the next whole wall-clock second."""
+    return time.monotonic() + 1.0 - (time.time() - TICK_OFFSET) % 1.0
+
+
+def _write_snapshot(path, snapshot):
+    """Writes {symbol: bars} as a single flat JSON document."""
+    def write(f):
+        # Encode in chunks so no single orjson call holds the GIL long enough to delay a tick
+        f.write(b"{")
+        for n, (symbol, bars) in enumerate(snapshot.items()):
+            f.write((b"," if n else b"") + orjson.dumps(symbol) + b":[")
+            for start in range(0, len(bars), SNAPSHOT_CHUNK):
+                chunk = orjson.dumps(_bar_records(bars[start:start + SNAPSHOT_CHUNK]))
+                f.write((b"," if start else b"") + chunk[1:-1])
+            f.write(b"]")
+        f.write(b"}")
+
+    _atomic_write(path, write)
+
 
-    st.p = c
-    st.prev_return = math.log(c / o) if o != 0 else 0
+def _final_save(states, history):
+    """Flushes everything still in memory to disk when the generator shuts down."""
+    print("Shutting down. Saving state, history and snapshot.")
+    _atomic_write_json(STATE_FILE, states.to_dict())
+    _append_history_log(HISTORY_FILE, history)
+    with _snapshot_lock:
+        _write_snapshot(SNAPSHOT_FILE, {s: bars.ordered() for s, bars in history.items()})
 
-    return {
-        "t": int(now_dt.timestamp() * 1000),
-        "o": round(o, 2),
-        "h": round(max(o, c), 2),
-        "l": round(min(o, c), 2),
-        "c": round(c, 2)
-    }
+
+def _git_worker(push_queue):
+    """Writes queued history snapshots, then commits and pushes the data files."""
+    while True:
+        commit_msg, snapshot, rotated = push_queue.get()
+        try:
+            if snapshot is not None:
+                with _snapshot_lock:
+                    _write_snapshot(SNAPSHOT_FILE, snapshot)
+                # Everything in the rotated log is in the snapshot now
+                if rotated: os.remove(ROTATED_HISTORY_FILE)
+            subprocess.run(["git", "add", SNAPSHOT_FILE, STATE_FILE], check=True, capture_output=True)
+            subprocess.run(["git", "commit", "-m", commit_msg], check=True, capture_output=True)
+            subprocess.run(["git", "push"], check=True, capture_output=True)
+            print("Successfully pushed to GitHub.")
+        except subprocess.CalledProcessError as e:
+            print(f"Error pushing to git: {e}\n{e.stderr.decode()}")
+        except Exception as e:
+            print(f"An unexpected error occurred during snapshot or git push: {e}")
 
 
 def main_loop():
@@ -161,59 +467,89 @@ def main_loop():
 
     # Load previous state or initialize new state
     if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, 'r') as f:
-            states = {s: SyntheticStream.from_dict(d) for s, d in json.load(f).items()}
-        print(f"Loaded existing state for {len(states)} symbols.")
+        with open(STATE_FILE, 'rb') as f:
+            states = StreamArray.from_dict(orjson.loads(f.read()))
+        print(f"Loaded existing state for {len(states.symbols)} symbols.")
     else:
-        states = {s: SyntheticStream(random.uniform(50, 200)) for s in SYMBOLS}
-        print(f"Initialized new state for {len(states)} symbols.")
-
-    # Load history or initialize
-    if os.path.exists(HISTORY_FILE):
-        with open(HISTORY_FILE, 'r') as f:
-            history = json.load(f)
-        print(f"Loaded existing history.")
+        states = StreamArray(SYMBOLS, [SyntheticStream(random.uniform(50, 200)) for _ in SYMBOLS])
+        print(f"Initialized new state for {len(states.symbols)} symbols.")
+
+    # Load history: the last snapshot plus any bars logged after it was taken
+    if os.path.exists(SNAPSHOT_FILE):
+        with open(SNAPSHOT_FILE, 'rb') as f:
+            history = {s: BarHistory.from_list(bars) for s, bars in orjson.loads(f.read()).items()}
+        print(f"Loaded existing history from {SNAPSHOT_FILE}.")
     else:
-        history = {s: [] for s in SYMBOLS}
+        history = {s: BarHistory() for s in SYMBOLS}
         print("Initialized new history file.")
+    for path in (ROTATED_HISTORY_FILE, HISTORY_FILE):
+        if os.path.exists(path):
+            print(f"Replayed {_read_history_log(path, history)} bars from {path}.")
 
-    last_save_minute = -1
-    while True:
-        now = datetime.now(timezone.utc)
-
-        # Generate one second of data for each stock
-        for symbol, stream in states.items():
-            new_bar = _generate_one_second(stream, now)
-            if symbol not in history: history[symbol] = []
-            history[symbol].append(new_bar)
+    # Ring buffers in the same slot order as the StreamArray, for the hot loop
+    history_list = [history.setdefault(s, BarHistory()) for s in states.symbols]
+    n_symbols = len(history_list)
 
-            # Trim history to prevent file from growing forever (e.g., keep last 3 days)
-            if len(history[symbol]) > 3 * 24 * 60 * 60:
-                history[symbol].pop(0)
+    # Fold everything recovered into a fresh snapshot so the logs can start out empty
+    _write_snapshot(SNAPSHOT_FILE, {s: bars.ordered() for s, bars in history.items()})
+    for path in (ROTATED_HISTORY_FILE, HISTORY_FILE):
+        if os.path.exists(path): os.remove(path)
 
-        # Save state and push to git periodically (e.g., every minute)
-        if now.minute != last_save_minute:
-            last_save_minute = now.minute
-            print(f"[{now.isoformat()}] Saving state and history. Pushing to remote. AAPL: ${states['AAPL'].p:.2f}")
+    # Git is slow (push goes over the network), so it runs off the tick thread
+    push_queue = queue.Queue()
+    threading.Thread(target=_git_worker, args=(push_queue,), daemon=True).start()
 
-            with open(STATE_FILE, 'w') as f:
-                json.dump({s: v.to_dict() for s, v in states.items()}, f)
-            with open(HISTORY_FILE, 'w') as f:
-                json.dump(history, f)
+    # Write a final snapshot on exit; SIGTERM is turned into a normal exit so this also runs then
+    atexit.register(_final_save, states, history)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
 
-            try:
-                subprocess.run(["git", "add", HISTORY_FILE, STATE_FILE], check=True, capture_output=True)
-                commit_msg = f"Data update {now.strftime('%Y-%m-%d %H:%M:%S UTC')}"
-                subprocess.run(["git", "commit", "-m", commit_msg], check=True, capture_output=True)
-                subprocess.run(["git", "push"], check=True, capture_output=True)
-                print("Successfully pushed to GitHub.")
-            except subprocess.CalledProcessError as e:
-                print(f"Error pushing to git: {e}\n{e.stderr.decode()}")
-            except Exception as e:
-                print(f"An unexpected error occurred during git push: {e}")
-
-        # Sleep until the next whole second to maintain a steady tick rate
-        time.sleep(1.0 - (datetime.now(timezone.utc).microsecond / 1_000_000.0))
+    last_save_minute = -1
+    last_snapshot_hour = int(time.time()) // 3600
+    next_deadline = _next_tick_deadline()
+    while True:
+        # Sleep until the tick deadline; the monotonic clock is immune to NTP adjustments
+        delay = next_deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        now_s = time.time()
+
+        # Generate one second of data for all stocks at once
+        t, o, h, l, c = _generate_one_second(states, now_s)
+        # The kernel has already rounded the bar prices to cents
+        o, h, l, c = o.tolist(), h.tolist(), l.tolist(), c.tolist()
+        for i in range(n_symbols):
+            # The ring buffer drops the oldest bar once it holds HISTORY_LENGTH of them.
+            history_list[i].append(t, o[i], h[i], l[i], c[i])
+
+        # Save state and new bars every minute; the full snapshot is only rewritten hourly
+        minute = int(now_s) // 60 % 60
+        if minute != last_save_minute:
+            last_save_minute = minute
+            now = datetime.fromtimestamp(now_s, timezone.utc)
+            print(f"[{now.isoformat()}] Saving state and history. Pushing to remote. {states.symbols[0]}: ${states.p[0]:.2f}")
+
+            _atomic_write_json(STATE_FILE, states.to_dict())
+            _append_history_log(HISTORY_FILE, history)
+
+            # Hourly, hand the worker a copy of the history to write out as the snapshot and start a new log.
+            # If the worker still holds the previous rotated log, keep appending; the next rotation covers both.
+            snapshot, rotated = None, False
+            hour = int(now_s) // 3600
+            if hour != last_snapshot_hour:
+                last_snapshot_hour = hour
+                snapshot = {s: bars.ordered().copy() for s, bars in history.items()}
+                if not os.path.exists(ROTATED_HISTORY_FILE):
+                    os.replace(HISTORY_FILE, ROTATED_HISTORY_FILE)
+                    rotated = True
+
+            push_queue.put((f"Data update {now.strftime('%Y-%m-%d %H:%M:%S UTC')}", snapshot, rotated))
+
+        # Re-align to wall-clock seconds after a stall or once clock slew has shifted the phase,
+        # so every tick lands in its own wall second
+        next_deadline += 1.0
+        aligned = _next_tick_deadline()
+        if abs(next_deadline - aligned) > 0.05:
+            next_deadline = aligned
 
 
 if __name__ == "__main__":